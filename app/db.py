@@ -1,6 +1,9 @@
 import os
 import psycopg2
+from psycopg2.extras import execute_values
 import logging
+from datetime import datetime
+from app.migrations import run_migrations, sql
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -13,17 +16,12 @@ if DATABASE_URL:
         conn.autocommit = True
         cursor = conn.cursor()
 
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS chats (
-            id SERIAL PRIMARY KEY,
-            platform TEXT,
-            user_id TEXT,
-            username TEXT,
-            question TEXT,
-            answer TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
+        # A failed migration is logged, not fatal: chats keep being saved.
+        # Table rewrites (partitioning) are left to python -m app.migrations.
+        try:
+            run_migrations(conn, offline=False)
+        except Exception as e:
+            logging.error(f"DB migration failed: {e}")
 
         logging.info("Database connected")
 
@@ -47,5 +45,83 @@ def save_chat(platform, user_id, username, question, answer):
     )
 
 
+def save_chats(rows):
+    if not cursor or not rows:
+        return
+
+    execute_values(
+        cursor,
+        """
+        INSERT INTO chats (platform, user_id, username, question, answer)
+        VALUES %s
+        """,
+        rows
+    )
+
+
+HISTORY_MAX_LIMIT = 200
+
+
+def encode_history_cursor(created_at, chat_id) -> str:
+    return f"{created_at.isoformat()}|{chat_id}"
+
+
+def decode_history_cursor(value: str):
+    created_at, chat_id = value.rsplit("|", 1)
+    return datetime.fromisoformat(created_at), int(chat_id)
+
+
+def get_chat_history(platform, user_id, limit=50, before=None, db=None):
+    # Keyset pagination, newest first: the next page starts strictly after
+    # the (created_at, id) of the last row, so every page is an index range
+    # scan on (platform, user_id, created_at, id) however deep it goes.
+    db = db or conn
+    if not db:
+        return {"items": [], "next_cursor": None}
+
+    limit = max(1, min(int(limit), HISTORY_MAX_LIMIT))
+    params = [platform, user_id]
+    keyset = ""
+
+    if before:
+        created_at, chat_id = decode_history_cursor(before)
+        keyset = "AND (created_at, id) < (%s, %s)"
+        params.extend([created_at, chat_id])
+
+    params.append(limit + 1)
+
+    cur = db.cursor()
+    cur.execute(
+        sql(db, f"""
+        SELECT id, username, question, answer, created_at
+        FROM chats
+        WHERE platform = %s AND user_id = %s {keyset}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+        """),
+        params
+    )
+    rows = cur.fetchall()
+
+    items = []
+    for chat_id, username, question, answer, created_at in rows[:limit]:
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        items.append({
+            "id": chat_id,
+            "username": username,
+            "question": question,
+            "answer": answer,
+            "created_at": created_at,
+        })
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_history_cursor(last["created_at"], last["id"])
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
 def save_question(question):
     pass
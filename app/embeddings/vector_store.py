@@ -1,9 +1,11 @@
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
 
 from app.ingestion.pdf_loader import load_pdf
 from app.ingestion.docx_loader import load_docx
-from app.ingestion.chunker import chunk_text
+from app.ingestion.chunker import chunk_sources
+from app.core.context import build_context, context_budget
 
 
 # ---------- Build FINUX vector DB once ----------
@@ -14,19 +16,24 @@ DOCX_PATH = "data/raw/finux.docx"
 pdf_text = load_pdf(PDF_PATH)
 docx_text = load_docx(DOCX_PATH)
 
-chunks = chunk_text(pdf_text + docx_text)
+# PDF first so duplicates keep their page numbers
+chunks, chunk_report = chunk_sources({"finux.pdf": pdf_text, "finux.docx": docx_text})
 
 embeddings = HuggingFaceEmbeddings(
     model_name="sentence-transformers/all-MiniLM-L6-v2"
 )
 
-db = FAISS.from_texts(chunks, embeddings)
+db = FAISS.from_texts(
+    [c["text"] for c in chunks],
+    embeddings,
+    metadatas=[{k: v for k, v in c.items() if k != "text"} for c in chunks]
+)
 
 
 # ---------- Public functions ----------
 
-def create_vector_store(chunks: list[str]):
-    return FAISS.from_texts(chunks, embeddings)
+def create_vector_store(chunks: list[str], metadatas: list[dict] | None = None):
+    return FAISS.from_texts(chunks, embeddings, metadatas=metadatas)
 
 
 def get_rag_answer(question: str) -> str:
@@ -36,13 +43,25 @@ def get_rag_answer(question: str) -> str:
         if not docs:
             return ""
 
-        text = "\n\n".join(d.page_content for d in docs)
-
-        # limit size
-        text = text[:1500]
+        text = build_context(question, [d.page_content for d in docs], context_budget(question))
 
         return text.strip()
 
     except Exception as e:
         print("RAG error:", e)
         return ""
+
+
+def search_chunks(questions: list[str], k: int = 3) -> list[list[str]]:
+    # One embedding batch and one FAISS search for all questions
+    vectors = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+    _, ids = db.index.search(vectors, k)
+
+    return [
+        [
+            db.docstore.search(db.index_to_docstore_id[int(i)]).page_content
+            for i in row
+            if i != -1
+        ]
+        for row in ids
+    ]
@@ -1,14 +1,214 @@
+import re
+import hashlib
+import logging
+from functools import lru_cache
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def chunk_text(texts: list[str]) -> list[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=150,
+from app.core.context import count_tokens, get_tokenizer
+
+# Sizes are in embedding-model tokens (all-MiniLM-L6-v2 truncates at 256)
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 30
+
+# Sections shorter than this are merged with the next one before splitting
+MIN_SECTION_TOKENS = 80
+
+# Near-duplicate detection: share of a chunk's word shingles already seen
+SHINGLE_SIZE = 5
+DUPLICATE_THRESHOLD = 0.8
+
+_PAGE_MARKER = re.compile(r"^\[Page (\d+)\]\s*$", re.MULTILINE)
+_WORD = re.compile(r"\w+")
+_NUMBERED = re.compile(r"^\d+\.\s+")
+_STEP = re.compile(r"\(Step \d+\)")
+_LETTER_ITEM = re.compile(r"^[A-Z]\.\s")
+_CONNECTORS = {"a", "an", "and", "the", "to", "in", "into", "of", "for", "on", "or", "with", "by", "all"}
+
+
+@lru_cache(maxsize=1)
+def get_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        get_tokenizer(),
+        chunk_size=CHUNK_TOKENS,
+        chunk_overlap=CHUNK_OVERLAP_TOKENS,
         separators=["\n\n", "\n", ".", " "]
     )
 
+
+# ---------- Provenance ----------
+
+def _is_heading(line: str) -> bool:
+    # Headings in the FINUX docs are short Title Case lines, optionally
+    # numbered ("6. Liquidity Pool (Step 5)"); bullets, table rows, list
+    # items and "Label: value" lines are body text.
+    line = line.strip()
+    if not line or len(line) > 60 or "\t" in line or ":" in line:
+        return False
+    if line[-1] in ".,;!" or not line[0].isalnum() or _LETTER_ITEM.match(line):
+        return False
+
+    title = _STEP.sub("", _NUMBERED.sub("", line)).strip()
+    if not title or any(c.isdigit() for c in title):
+        return False
+
+    words = [w for w in re.findall(r"[^\W\d_]+", title) if w.lower() not in _CONNECTORS]
+    return bool(words) and len(words) <= 8 and all(w[0].isupper() for w in words)
+
+
+def _split_pages(text: str) -> list[tuple[int | None, str]]:
+    markers = list(_PAGE_MARKER.finditer(text))
+    if not markers:
+        return [(None, text)]
+
+    pages = []
+    for i, m in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        pages.append((int(m.group(1)), text[m.end():end]))
+    return pages
+
+
+def _split_sections(text: str, section: str) -> tuple[list[tuple[str, str]], str]:
+    sections = []
+    buffer = []
+
+    for line in text.split("\n"):
+        if _is_heading(line):
+            if buffer:
+                sections.append((section, "\n".join(buffer)))
+                buffer = []
+            section = line.strip()
+        buffer.append(line)
+
+    if buffer:
+        sections.append((section, "\n".join(buffer)))
+    return sections, section
+
+
+def _merge_small_sections(sections: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    # Short sections ride along with the next one, so chunks stay close to
+    # CHUNK_TOKENS and keep their context; the label lists every heading.
+    merged = []
+    labels, bodies, tokens = [], [], 0
+
+    for section, body in sections:
+        if section and section not in labels:
+            labels.append(section)
+        bodies.append(body)
+        tokens += count_tokens(body)
+
+        if tokens >= MIN_SECTION_TOKENS:
+            merged.append((" / ".join(labels), "\n".join(bodies)))
+            labels, bodies, tokens = [], [], 0
+
+    if bodies:
+        if merged:
+            label, body = merged.pop()
+            label_parts = label.split(" / ") if label else []
+            labels = label_parts + [l for l in labels if l not in label_parts]
+            bodies = [body] + bodies
+        merged.append((" / ".join(labels), "\n".join(bodies)))
+
+    return merged
+
+
+def chunk_documents(texts: list[str], source: str = "") -> list[dict]:
     chunks = []
+    section = ""
+
     for text in texts:
-        chunks.extend(splitter.split_text(text))
+        for page, page_text in _split_pages(text):
+            sections, section = _split_sections(page_text, section)
+            for label, body in _merge_small_sections(sections):
+                for piece in get_splitter().split_text(body):
+                    if piece.strip():
+                        chunks.append({
+                            "text": piece.strip(),
+                            "source": source,
+                            "page": page,
+                            "section": label,
+                        })
 
     return chunks
+
+
+# ---------- Near-duplicate removal ----------
+#
+# A chunk is a near-duplicate when most of its shingles already appear in
+# the chunks kept before it. Scoring containment against everything kept,
+# rather than similarity to one other chunk, makes the result independent
+# of where the splitter cut each source: a DOCX chunk that straddles two
+# PDF pages is still found in the union of the two PDF chunks.
+
+def _shingles(text: str) -> set[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def shingle_hashes(text: str) -> set[int]:
+    return {
+        int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+        for s in _shingles(text)
+    }
+
+
+def dedupe_chunks(chunks: list[dict], threshold: float = DUPLICATE_THRESHOLD) -> tuple[list[dict], dict]:
+    seen = set()
+    kept = []
+    removed = 0
+    tokens_in = 0
+    tokens_out = 0
+    previous = (None, set())
+
+    for chunk in chunks:
+        tokens = count_tokens(chunk["text"])
+        tokens_in += tokens
+
+        hashes = shingle_hashes(chunk["text"])
+
+        # The splitter repeats the tail of the previous chunk of the same
+        # source; that overlap is not evidence of a duplicate.
+        source, previous_hashes = previous
+        own = hashes - previous_hashes if source == chunk.get("source") else hashes
+        previous = (chunk.get("source"), hashes)
+
+        if not own or len(own & seen) >= threshold * len(own):
+            removed += 1
+            continue
+
+        kept.append(chunk)
+        seen |= hashes
+        tokens_out += tokens
+
+    report = {
+        "chunks_in": len(chunks),
+        "chunks_out": len(kept),
+        "removed": removed,
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+    }
+    return kept, report
+
+
+def chunk_sources(sources: dict[str, list[str]]) -> tuple[list[dict], dict]:
+    chunks = []
+    for source, texts in sources.items():
+        chunks.extend(chunk_documents(texts, source))
+
+    kept, report = dedupe_chunks(chunks)
+
+    logging.info(
+        f"Chunker: kept {report['chunks_out']}/{report['chunks_in']} chunks, "
+        f"removed {report['removed']} near-duplicates "
+        f"({report['tokens_in'] - report['tokens_out']} tokens)"
+    )
+    return kept, report
+
+
+def chunk_text(texts: list[str]) -> list[str]:
+    chunks, _ = dedupe_chunks(chunk_documents(texts))
+    return [c["text"] for c in chunks]
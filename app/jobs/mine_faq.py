@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import logging
+from collections import Counter
+
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from app.core.faq import FAQ_PATH, normalize_question, load_faq_entries
+from app.core.documents import find_short_answer
+
+# Offline job: python -m app.jobs.mine_faq
+#
+# Streams the chats table, groups questions that Gemini had to answer into
+# clusters of similar phrasings and writes the frequent ones to
+# var/faq_answers.json (or FAQ_ANSWERS_PATH) with "approved": false. Once
+# a reviewer sets "approved": true (and fixes the answer if needed) the API
+# serves it from memory before find_short_answer.
+
+FETCH_SIZE = 2000
+EMBED_BATCH_SIZE = 256
+SIMILARITY_THRESHOLD = 0.85
+MIN_CLUSTER_SIZE = 5
+MAX_QUESTIONS_PER_ENTRY = 50
+LEADER_BLOCK = 4096
+
+FALLBACK_ANSWER = "Sorry, I could not generate a response."
+
+# Telegram callbacks are stored as menu keys (e.g. "wallet_info")
+_CALLBACK_KEY = re.compile(r"^[a-z]+(_[a-z]+)+$")
+
+
+def stream_chats(conn):
+    # Named cursor = server-side, rows arrive FETCH_SIZE at a time
+    cursor = conn.cursor(name="faq_mining")
+    cursor.itersize = FETCH_SIZE
+
+    try:
+        cursor.execute(
+            """
+            SELECT question, answer
+            FROM chats
+            WHERE question IS NOT NULL AND answer IS NOT NULL
+            """
+        )
+        for question, answer in cursor:
+            yield question, answer
+    finally:
+        cursor.close()
+
+
+def collect_llm_questions(rows, find_short_answer) -> dict[str, Counter]:
+    # normalized question -> Counter of answers it received
+    questions = {}
+
+    for question, answer in rows:
+        question = question.strip()
+        if not question or question.startswith("/") or _CALLBACK_KEY.match(question):
+            continue
+        if answer == FALLBACK_ANSWER:
+            continue
+
+        key = normalize_question(question)
+        if not key:
+            continue
+
+        if key not in questions:
+            # answered from the documents, so Gemini was never involved
+            if find_short_answer(question):
+                questions[key] = None
+                continue
+            questions[key] = Counter()
+
+        if questions[key] is not None:
+            questions[key][answer] += 1
+
+    return {k: v for k, v in questions.items() if v is not None}
+
+
+def cluster_questions(questions: dict[str, Counter], embeddings) -> list[dict]:
+    # Most frequent phrasings first, so they become the cluster leaders
+    ordered = sorted(questions, key=lambda q: -sum(questions[q].values()))
+
+    # Leader vectors live in a matrix grown LEADER_BLOCK rows at a time
+    leaders = None
+    clusters = []
+
+    for start in range(0, len(ordered), EMBED_BATCH_SIZE):
+        batch = ordered[start:start + EMBED_BATCH_SIZE]
+        vectors = np.asarray(embeddings.embed_documents(batch), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+
+        if leaders is None:
+            leaders = np.empty((LEADER_BLOCK, vectors.shape[1]), dtype=np.float32)
+
+        # One product against every leader known before this batch ...
+        known = len(clusters)
+        sims = vectors @ leaders[:known].T if known else np.zeros((len(batch), 0), dtype=np.float32)
+
+        for row, (question, vector) in enumerate(zip(batch, vectors)):
+            best, best_sim = -1, SIMILARITY_THRESHOLD
+            if known:
+                best = int(sims[row].argmax())
+                best_sim = sims[row, best]
+
+            # ... plus the few leaders this batch has added so far
+            if len(clusters) > known:
+                new_sims = leaders[known:len(clusters)] @ vector
+                new_best = int(new_sims.argmax())
+                if best < 0 or new_sims[new_best] > best_sim:
+                    best, best_sim = known + new_best, new_sims[new_best]
+
+            if best >= 0 and best_sim >= SIMILARITY_THRESHOLD:
+                clusters[best]["questions"].append(question)
+                clusters[best]["answers"].update(questions[question])
+                continue
+
+            if len(clusters) == len(leaders):
+                leaders = np.vstack([leaders, np.empty_like(leaders[:LEADER_BLOCK])])
+            leaders[len(clusters)] = vector
+            clusters.append({
+                "questions": [question],
+                "answers": Counter(questions[question]),
+            })
+
+    return clusters
+
+
+def build_entries(clusters: list[dict], existing: list[dict]) -> list[dict]:
+    # Reviewed entries are kept as they are; new candidates are added
+    # unapproved for review.
+    reviewed = [e for e in existing if e.get("approved")]
+    known = {normalize_question(q) for e in reviewed for q in e.get("questions", [])}
+
+    candidates = []
+    for cluster in clusters:
+        count = sum(cluster["answers"].values())
+        if count < MIN_CLUSTER_SIZE:
+            continue
+        if cluster["questions"][0] in known:
+            continue
+
+        candidates.append({
+            "question": cluster["questions"][0],
+            "questions": cluster["questions"][:MAX_QUESTIONS_PER_ENTRY],
+            "count": count,
+            "answer": cluster["answers"].most_common(1)[0][0],
+            "approved": False,
+        })
+
+    candidates.sort(key=lambda e: -e["count"])
+    return reviewed + candidates
+
+
+def mine_faq(conn, output_path: str = FAQ_PATH) -> list[dict]:
+    questions = collect_llm_questions(stream_chats(conn), find_short_answer)
+    logging.info(f"FAQ mining: {len(questions)} distinct questions went to Gemini")
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name="sentence-transformers/all-MiniLM-L6-v2"
+    )
+    clusters = cluster_questions(questions, embeddings)
+
+    entries = build_entries(clusters, load_faq_entries(output_path))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+
+    return entries
+
+
+if __name__ == "__main__":
+    import psycopg2
+
+    logging.basicConfig(level=logging.INFO)
+
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is missing")
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        entries = mine_faq(conn)
+    finally:
+        conn.close()
+
+    pending = sum(1 for e in entries if not e.get("approved"))
+    print(f"FAQ table written: {len(entries)} entries, {pending} waiting for review")
@@ -0,0 +1,48 @@
+import os
+import logging
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.migrations import run_migrations, rollup_and_purge
+
+# Offline job: python -m app.jobs.retention
+#
+# Chats older than CHAT_RETENTION_DAYS are folded into the chats_daily
+# table and removed; whole monthly partitions are dropped instead of
+# deleted row by row. Migrations (and the next months' partitions) are
+# brought up to date first.
+
+RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "180"))
+
+
+def run_retention(conn, today: date | None = None) -> dict:
+    today = today or date.today()
+
+    # also creates the partitions for the coming months
+    run_migrations(conn)
+
+    return rollup_and_purge(conn, today - timedelta(days=RETENTION_DAYS))
+
+
+if __name__ == "__main__":
+    import psycopg2
+
+    logging.basicConfig(level=logging.INFO)
+
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is missing")
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        report = run_retention(conn)
+    finally:
+        conn.close()
+
+    print(
+        f"Retention: {report['rollup_rows']} (day, platform) rollups written, "
+        f"{len(report['dropped_partitions'])} partitions dropped, "
+        f"{report['deleted_rows']} rows deleted"
+    )
@@ -4,7 +4,7 @@ load_dotenv()
 
 from app.ingestion.pdf_loader import load_pdf
 from app.ingestion.docx_loader import load_docx
-from app.ingestion.chunker import chunk_text
+from app.ingestion.chunker import chunk_sources
 from app.embeddings.vector_store import create_vector_store
 
 PDF_PATH = "data/raw/finux.pdf"
@@ -14,10 +14,17 @@ def build_knowledge_base():
     pdf_text = load_pdf(PDF_PATH)
     docx_text = load_docx(DOCX_PATH)
 
-    all_text = pdf_text + docx_text
-    chunks = chunk_text(all_text)
+    chunks, report = chunk_sources({"finux.pdf": pdf_text, "finux.docx": docx_text})
+    print(
+        f"Chunks: {report['chunks_in']} -> {report['chunks_out']} "
+        f"({report['removed']} near-duplicates removed, "
+        f"{report['tokens_in'] - report['tokens_out']} tokens saved)"
+    )
 
-    vector_db = create_vector_store(chunks)
+    vector_db = create_vector_store(
+        [c["text"] for c in chunks],
+        [{k: v for k, v in c.items() if k != "text"} for c in chunks]
+    )
     return vector_db
 
 if __name__ == "__main__":
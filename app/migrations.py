@@ -0,0 +1,325 @@
+import os
+import sqlite3
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime
+
+# Schema migrations for the chats storage.
+#
+# Works against Postgres (psycopg2) and, for local testing, sqlite3.
+# Postgres gets monthly range partitions on created_at; sqlite keeps a
+# plain table with the same columns and indexes.
+#
+# The web app applies pending migrations on startup up to the first one in
+# OFFLINE_MIGRATIONS; those rewrite whole tables and only run from
+# "python -m app.migrations" or the retention job.
+
+PARTITION_MONTHS_AHEAD = 3
+
+# Arbitrary key for pg_advisory_xact_lock so two app instances starting
+# together do not run the same migration twice.
+MIGRATION_LOCK_ID = 724101
+
+
+def is_sqlite(conn) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+
+def sql(conn, query: str) -> str:
+    # Queries are written with psycopg2 placeholders
+    return query.replace("%s", "?") if is_sqlite(conn) else query
+
+
+@contextmanager
+def transaction(conn):
+    # psycopg2 refuses to change autocommit inside an open transaction, so
+    # it is only switched off (and back on) when the connection had it on.
+    restore = not is_sqlite(conn) and conn.autocommit
+    if restore:
+        conn.autocommit = False
+
+    try:
+        yield conn.cursor()
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        if restore:
+            conn.autocommit = True
+
+
+# ---------- Partitions ----------
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _add_months(d: date, months: int) -> date:
+    month = d.month - 1 + months
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"chats_y{month.year}m{month.month:02d}"
+
+
+def ensure_partitions(cursor, start: date, end: date):
+    month = _month_start(start)
+    while month <= end:
+        name = partition_name(month)
+        bounds = (month, _add_months(month, 1))
+
+        cursor.execute("SELECT to_regclass(%s)", (name,))
+        if cursor.fetchone()[0] is None:
+            # Rows that landed in chats_default while the month had no
+            # partition must move first, or attaching the range fails.
+            cursor.execute(f"CREATE TABLE {name} (LIKE chats INCLUDING DEFAULTS)")
+            cursor.execute(
+                f"""
+                WITH moved AS (
+                    DELETE FROM chats_default
+                    WHERE created_at >= %s AND created_at < %s
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+                """,
+                bounds
+            )
+            cursor.execute(
+                f"ALTER TABLE chats ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                bounds
+            )
+
+        month = _add_months(month, 1)
+
+
+def ensure_future_partitions(conn, today: date | None = None) -> bool:
+    # Not fatal: without a partition new rows still land in chats_default
+    if is_sqlite(conn):
+        return True
+
+    today = today or date.today()
+    try:
+        with transaction(conn) as cursor:
+            ensure_partitions(cursor, today, _add_months(today, PARTITION_MONTHS_AHEAD))
+        return True
+    except Exception as e:
+        logging.error(f"Partition maintenance failed: {e}")
+        return False
+
+
+# ---------- Migrations ----------
+
+def _create_chats(conn, cursor):
+    id_column = "INTEGER PRIMARY KEY AUTOINCREMENT" if is_sqlite(conn) else "SERIAL PRIMARY KEY"
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS chats (
+        id {id_column},
+        platform TEXT,
+        user_id TEXT,
+        username TEXT,
+        question TEXT,
+        answer TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def _partition_chats(conn, cursor):
+    if is_sqlite(conn):
+        return
+
+    # Partitioned tables need the partition key in the primary key
+    cursor.execute("ALTER TABLE chats RENAME TO chats_legacy")
+    cursor.execute("ALTER SEQUENCE chats_id_seq RENAME TO chats_legacy_id_seq")
+    cursor.execute("""
+    CREATE TABLE chats (
+        id BIGSERIAL,
+        platform TEXT,
+        user_id TEXT,
+        username TEXT,
+        question TEXT,
+        answer TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """)
+    cursor.execute("CREATE TABLE IF NOT EXISTS chats_default PARTITION OF chats DEFAULT")
+
+    cursor.execute("SELECT MIN(created_at) FROM chats_legacy")
+    oldest = cursor.fetchone()[0]
+    today = date.today()
+    ensure_partitions(
+        cursor,
+        oldest.date() if oldest else today,
+        _add_months(today, PARTITION_MONTHS_AHEAD)
+    )
+
+    cursor.execute("""
+    INSERT INTO chats (id, platform, user_id, username, question, answer, created_at)
+    SELECT id, platform, user_id, username, question, answer,
+           COALESCE(created_at, CURRENT_TIMESTAMP)
+    FROM chats_legacy
+    """)
+    cursor.execute("""
+    SELECT setval('chats_id_seq', COALESCE((SELECT MAX(id) FROM chats), 0) + 1, false)
+    """)
+    cursor.execute("DROP TABLE chats_legacy")
+
+
+def _index_chats(conn, cursor):
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS chats_platform_user_created_idx
+    ON chats (platform, user_id, created_at, id)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS chats_created_idx
+    ON chats (created_at)
+    """)
+
+
+def _create_daily_rollups(conn, cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chats_daily (
+        day DATE NOT NULL,
+        platform TEXT NOT NULL,
+        chat_count INTEGER NOT NULL,
+        user_count INTEGER NOT NULL,
+        PRIMARY KEY (day, platform)
+    )
+    """)
+
+
+MIGRATIONS = [
+    (1, "create chats", _create_chats),
+    (2, "partition chats by month", _partition_chats),
+    (3, "index chats", _index_chats),
+    (4, "daily chat rollups", _create_daily_rollups),
+]
+
+# Copies every chat into the partitioned table inside one transaction
+OFFLINE_MIGRATIONS = {2}
+
+
+def run_migrations(conn, offline: bool = True) -> list[int]:
+    # Returns the versions still pending; with offline=False everything
+    # from the first offline migration on is left for later, so versions
+    # are always applied in order.
+    pending = []
+
+    with transaction(conn) as cursor:
+        if not is_sqlite(conn):
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        for version, name, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+
+            if pending or (version in OFFLINE_MIGRATIONS and not offline):
+                pending.append(version)
+                continue
+
+            migrate(conn, cursor)
+            cursor.execute(
+                sql(conn, "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)"),
+                (version, name)
+            )
+            logging.info(f"Applied migration {version}: {name}")
+
+    if pending:
+        logging.warning(
+            f"Migrations {pending} are pending; apply them with: python -m app.migrations"
+        )
+    else:
+        ensure_future_partitions(conn)
+
+    return pending
+
+
+# ---------- Retention ----------
+
+def rollup_and_purge(conn, cutoff: date) -> dict:
+    # Whole days before the cutoff are folded into chats_daily and their
+    # rows removed in the same transaction, so each day is rolled up once.
+    # Only rows written late for an already rolled-up day can hit the
+    # conflict branch: chat_count is added, but distinct users cannot be
+    # summed, so user_count keeps the larger of the two (a lower bound).
+    cutoff_ts = datetime(cutoff.year, cutoff.month, cutoff.day)
+    day_expr = "date(created_at)" if is_sqlite(conn) else "created_at::date"
+    greatest = "MAX" if is_sqlite(conn) else "GREATEST"
+
+    with transaction(conn) as cursor:
+        cursor.execute(
+            sql(conn, f"""
+            INSERT INTO chats_daily (day, platform, chat_count, user_count)
+            SELECT {day_expr}, COALESCE(platform, ''), COUNT(*), COUNT(DISTINCT user_id)
+            FROM chats
+            WHERE created_at < %s
+            GROUP BY {day_expr}, COALESCE(platform, '')
+            ON CONFLICT (day, platform) DO UPDATE SET
+                chat_count = chats_daily.chat_count + excluded.chat_count,
+                user_count = {greatest}(chats_daily.user_count, excluded.user_count)
+            """),
+            (cutoff_ts,)
+        )
+        # one row per (day, platform), inserted or topped up
+        rollup_rows = cursor.rowcount
+
+        dropped = []
+        if not is_sqlite(conn):
+            # Partitions entirely before the cutoff go away without a scan
+            month = _month_start(cutoff)
+            cursor.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'chats' AND c.relname LIKE 'chats\\_y%'
+            """)
+            for (name,) in cursor.fetchall():
+                if name < partition_name(month):
+                    cursor.execute(f"DROP TABLE {name}")
+                    dropped.append(name)
+
+        cursor.execute(sql(conn, "DELETE FROM chats WHERE created_at < %s"), (cutoff_ts,))
+        deleted = cursor.rowcount
+
+    return {
+        "rollup_rows": rollup_rows,
+        "dropped_partitions": dropped,
+        "deleted_rows": deleted,
+    }
+
+
+if __name__ == "__main__":
+    # Applies every pending migration, including the offline ones
+    import psycopg2
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    logging.basicConfig(level=logging.INFO)
+
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is missing")
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        run_migrations(conn)
+    finally:
+        conn.close()
+
+    print("Migrations applied")
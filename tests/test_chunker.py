@@ -0,0 +1,82 @@
+import os
+import re
+
+import pytest
+
+pytest.importorskip("transformers")
+text_splitters = pytest.importorskip("langchain_text_splitters")
+
+from app.core import context
+from app.ingestion import chunker
+
+FINUX_TXT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "finux.txt")
+
+
+class WordTokenizer:
+    # Offline stand-in for the MiniLM tokenizer: one token per word or sign
+    def encode(self, text, add_special_tokens=False):
+        return re.findall(r"\w+|[^\w\s]", text)
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    tokenizer = WordTokenizer()
+    monkeypatch.setattr(context, "get_tokenizer", lambda: tokenizer)
+    monkeypatch.setattr(chunker, "get_splitter", lambda: text_splitters.RecursiveCharacterTextSplitter(
+        chunk_size=chunker.CHUNK_TOKENS,
+        chunk_overlap=chunker.CHUNK_OVERLAP_TOKENS,
+        length_function=context.count_tokens,
+        separators=["\n\n", "\n", ".", " "]
+    ))
+
+
+def finux_text() -> str:
+    with open(FINUX_TXT, encoding="utf-8") as f:
+        return f.read()
+
+
+def paged(text: str, lines_per_page: int = 40) -> list[str]:
+    # Same shape as load_pdf: one "[Page N]" string per page
+    lines = text.split("\n")
+    return [
+        f"[Page {n + 1}]\n" + "\n".join(lines[start:start + lines_per_page])
+        for n, start in enumerate(range(0, len(lines), lines_per_page))
+    ]
+
+
+@pytest.mark.parametrize("first", ["finux.pdf", "finux.docx"])
+def test_paged_and_unpaged_copies_collapse(first):
+    text = finux_text()
+    sources = {"finux.pdf": paged(text), "finux.docx": [text]}
+    sources = {first: sources[first], **sources}
+
+    kept, report = chunker.chunk_sources(sources)
+    first_chunks = chunker.chunk_documents(sources[first], first)
+
+    assert report["chunks_in"] > len(first_chunks)
+    assert [c["source"] for c in kept] == [first] * len(first_chunks)
+    assert report["removed"] == report["chunks_in"] - len(first_chunks)
+    assert report["tokens_out"] < report["tokens_in"]
+
+
+def test_splitter_overlap_is_not_a_duplicate():
+    chunks = chunker.chunk_documents(paged(finux_text()), "finux.pdf")
+
+    kept, report = chunker.dedupe_chunks(chunks)
+
+    assert len(chunks) > 1
+    assert kept == chunks
+    assert report["removed"] == 0
+
+
+def test_distinct_text_is_kept():
+    chunks = [
+        {"text": "Minimum deposit is 20 USDCe, split 70% USDCe and 30% MSTC.", "source": "a"},
+        {"text": "Referral rewards are paid from the referral program wallet.", "source": "b"},
+        {"text": "Minimum deposit is 20 USDCe, split 70% USDCe and 30% MSTC.", "source": "b"},
+    ]
+
+    kept, report = chunker.dedupe_chunks(chunks)
+
+    assert kept == chunks[:2]
+    assert report["removed"] == 1
@@ -0,0 +1,156 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.migrations import MIGRATIONS, OFFLINE_MIGRATIONS, run_migrations, rollup_and_purge
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    run_migrations(conn)
+    yield conn
+    conn.close()
+
+
+def add_chats(conn, rows):
+    conn.executemany(
+        "INSERT INTO chats (platform, user_id, username, question, answer, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+
+
+def schema(conn):
+    return conn.execute("SELECT type, name FROM sqlite_master ORDER BY name").fetchall()
+
+
+# ---------- Migrations ----------
+
+def test_run_migrations_is_idempotent(conn):
+    add_chats(conn, [("web", "u1", "", "q", "a", datetime(2026, 1, 1))])
+    before = schema(conn)
+
+    assert run_migrations(conn) == []
+    assert run_migrations(conn) == []
+
+    assert schema(conn) == before
+    assert conn.execute("SELECT version FROM schema_migrations ORDER BY version").fetchall() == [
+        (version,) for version, _, _ in MIGRATIONS
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0] == 1
+
+
+def test_startup_stops_before_offline_migrations():
+    conn = sqlite3.connect(":memory:")
+    first_offline = min(OFFLINE_MIGRATIONS)
+    later = [version for version, _, _ in MIGRATIONS if version >= first_offline]
+
+    assert run_migrations(conn, offline=False) == later
+    assert run_migrations(conn, offline=False) == later
+    applied = [row[0] for row in conn.execute("SELECT version FROM schema_migrations ORDER BY version")]
+    assert applied == [version for version, _, _ in MIGRATIONS if version < first_offline]
+
+    assert run_migrations(conn) == []
+    assert run_migrations(conn, offline=False) == []
+
+
+# ---------- History paging ----------
+
+def test_history_keyset_paging_has_no_gaps_or_duplicates(conn, monkeypatch):
+    # app.db connects on import when DATABASE_URL is set
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    db = pytest.importorskip("app.db")
+
+    start = datetime(2026, 3, 1, 12, 0)
+    rows = []
+    for n in range(40):
+        # groups of identical timestamps, so paging has to break ties on id
+        rows.append(("telegram", "42", "ann", f"q{n}", f"a{n}", start + timedelta(minutes=n // 4)))
+        rows.append(("telegram", "7", "bob", f"other {n}", "", start + timedelta(minutes=n)))
+    add_chats(conn, rows)
+
+    expected = [
+        row[0] for row in conn.execute(
+            "SELECT id FROM chats WHERE platform = 'telegram' AND user_id = '42' ORDER BY created_at DESC, id DESC"
+        )
+    ]
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page = db.get_chat_history("telegram", "42", limit=7, before=cursor, db=conn)
+        seen.extend(item["id"] for item in page["items"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert len(set(seen)) == 40
+    assert pages == 6
+
+
+# ---------- Retention ----------
+
+def daily(conn):
+    return conn.execute(
+        "SELECT day, platform, chat_count, user_count FROM chats_daily ORDER BY day, platform"
+    ).fetchall()
+
+
+def test_rollup_and_purge_counts_and_deletes(conn):
+    add_chats(conn, [
+        ("web", "u1", "", "q", "a", datetime(2026, 1, 1, 9)),
+        ("web", "u1", "", "q", "a", datetime(2026, 1, 1, 10)),
+        ("web", "u2", "", "q", "a", datetime(2026, 1, 1, 23, 59)),
+        ("telegram", "u1", "", "q", "a", datetime(2026, 1, 1, 11)),
+        ("web", "u3", "", "q", "a", datetime(2026, 1, 2, 8)),
+        (None, "u4", "", "q", "a", datetime(2026, 1, 2, 9)),
+        # on or after the cutoff: kept
+        ("web", "u1", "", "q", "a", datetime(2026, 1, 3, 0)),
+        ("web", "u5", "", "q", "a", datetime(2026, 1, 4, 12)),
+    ])
+
+    report = rollup_and_purge(conn, date(2026, 1, 3))
+
+    assert report == {"rollup_rows": 4, "dropped_partitions": [], "deleted_rows": 6}
+    assert daily(conn) == [
+        ("2026-01-01", "telegram", 1, 1),
+        ("2026-01-01", "web", 3, 2),
+        ("2026-01-02", "", 1, 1),
+        ("2026-01-02", "web", 1, 1),
+    ]
+    assert conn.execute("SELECT COUNT(*) FROM chats WHERE created_at < '2026-01-03'").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0] == 2
+
+    # Nothing left before the cutoff: a second run changes nothing
+    assert rollup_and_purge(conn, date(2026, 1, 3))["deleted_rows"] == 0
+    assert len(daily(conn)) == 4
+
+
+def test_late_rows_are_added_to_existing_rollups(conn):
+    add_chats(conn, [
+        ("web", "u1", "", "q", "a", datetime(2026, 1, 1, 9)),
+        ("web", "u2", "", "q", "a", datetime(2026, 1, 1, 10)),
+        ("web", "u3", "", "q", "a", datetime(2026, 1, 1, 11)),
+    ])
+    rollup_and_purge(conn, date(2026, 1, 2))
+
+    # Written after that day was rolled up
+    add_chats(conn, [
+        ("web", "u1", "", "q", "a", datetime(2026, 1, 1, 20)),
+        ("web", "u9", "", "q", "a", datetime(2026, 1, 1, 21)),
+        ("telegram", "u1", "", "q", "a", datetime(2026, 1, 1, 22)),
+    ])
+    report = rollup_and_purge(conn, date(2026, 1, 2))
+
+    assert report["rollup_rows"] == 2
+    assert report["deleted_rows"] == 3
+    # chat counts add up; distinct users cannot, so the larger count is kept
+    assert daily(conn) == [
+        ("2026-01-01", "telegram", 1, 1),
+        ("2026-01-01", "web", 5, 3),
+    ]